@@ -1,3 +1,6 @@
+import html
+import math
+
 import streamlit as st
 import pandas as pd
 from script import calcular_rebalanceamento_otimizado_silencioso
@@ -10,6 +13,17 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _run_rebalance(ativos_tuple, alvos_tuple, fixos_tuple):
+    """Executa o rebalanceamento memorizando o resultado por entrada (chaves hasheáveis)."""
+    return calcular_rebalanceamento_otimizado_silencioso(
+        ativos_atuais=dict(ativos_tuple),
+        percentuais_alvo=dict(alvos_tuple),
+        ativos_fixos=list(fixos_tuple) or None
+    )
+
+
 # Título principal
 st.title("📊 Sistema de Rebalanceamento de Classes de ativos")
 st.markdown("---")
@@ -19,6 +33,8 @@ if 'ativos' not in st.session_state:
     st.session_state.ativos = {}
 if 'resultado' not in st.session_state:
     st.session_state.resultado = None
+if 'ativos_fixos' not in st.session_state:
+    st.session_state.ativos_fixos = []
 
 # Sidebar para entrada de dados
 st.sidebar.header("💼 Configuração da Carteira")
@@ -40,26 +56,44 @@ with st.sidebar.form("adicionar_ativo"):
         st.sidebar.success(f"Ativo {nome_ativo} adicionado!")
 
 # Exibir classes atuais e permitir remoção
-if st.session_state.ativos:
-    st.sidebar.subheader("Classes na Carteira")
-    for ativo in list(st.session_state.ativos.keys()):
-        col1, col2 = st.sidebar.columns([3, 1])
+@st.fragment
+def _render_sidebar_assets():
+    """Lista as classes da carteira; como fragmento, só reexecuta com seus próprios widgets."""
+    if not st.session_state.ativos:
+        return
+    st.subheader("Classes na Carteira")
+    for ativo, dados in list(st.session_state.ativos.items()):
+        col1, col2 = st.columns([3, 1])
         with col1:
             st.write(f"**{ativo}**")
-            st.write(f"R$ {st.session_state.ativos[ativo]['valor_atual']:,.2f} ({st.session_state.ativos[ativo]['percentual_alvo']:.1f}%)")
+            st.write(f"R$ {dados['valor_atual']:,.2f} ({dados['percentual_alvo']:.1f}%)")
         with col2:
             if st.button("🗑️", key=f"remove_{ativo}", help=f"Remover {ativo}"):
                 del st.session_state.ativos[ativo]
+                # A remoção altera a carteira inteira: reexecutar o app todo
                 st.rerun()
 
+
+# Fragmentos não podem escrever em st.sidebar; chamá-lo dentro do contexto da sidebar
+with st.sidebar:
+    _render_sidebar_assets()
+
 # Área principal
+# Totais da carteira em uma única passada pelos ativos (fsum evita acúmulo de erro)
+valores_atuais = []
+percentuais_alvo_atuais = []
+for dados in st.session_state.ativos.values():
+    valores_atuais.append(dados['valor_atual'])
+    percentuais_alvo_atuais.append(dados['percentual_alvo'])
+patrimonio_total = math.fsum(valores_atuais)
+soma_percentuais = math.fsum(percentuais_alvo_atuais)
+nomes = tuple(st.session_state.ativos)
+
 col1, col2 = st.columns([2, 1])
 
 with col1:
     if st.session_state.ativos:
         # Verificar se soma dos percentuais é 100%
-        soma_percentuais = sum(ativo['percentual_alvo'] for ativo in st.session_state.ativos.values())
-        
         if abs(soma_percentuais - 100) > 0.01:
             st.error(f"⚠️ A soma dos percentuais alvo deve ser 100%. Atual: {soma_percentuais:.2f}%")
         else:
@@ -67,14 +101,16 @@ with col1:
         
         # Tabela com ativos atuais
         st.subheader("📋 Carteira Atual")
-        df_ativos = pd.DataFrame.from_dict(st.session_state.ativos, orient='index')
-        df_ativos.columns = ['Valor Atual (R$)', 'Percentual Alvo (%)']
-        df_ativos['Valor Atual (R$)'] = df_ativos['Valor Atual (R$)'].apply(lambda x: f"R$ {x:,.2f}")
-        df_ativos['Percentual Alvo (%)'] = df_ativos['Percentual Alvo (%)'].apply(lambda x: f"{x:.1f}%")
+        df_ativos = pd.DataFrame(
+            {
+                'Valor Atual (R$)': [f"R$ {v['valor_atual']:,.2f}" for v in st.session_state.ativos.values()],
+                'Percentual Alvo (%)': [f"{v['percentual_alvo']:.1f}%" for v in st.session_state.ativos.values()]
+            },
+            index=list(nomes)
+        )
         st.dataframe(df_ativos, use_container_width=True)
         
         # Patrimônio total
-        patrimonio_total = sum(ativo['valor_atual'] for ativo in st.session_state.ativos.values())
         st.metric("💰 Patrimônio Total", f"R$ {patrimonio_total:,.2f}")
         
     else:
@@ -85,39 +121,47 @@ with col2:
         st.subheader("⚙️ Configurações do Cálculo")
         
         # Seleção de ativos fixos
-        ativos_disponiveis = list(st.session_state.ativos.keys())
         ativos_fixos = st.multiselect(
             "🔒 Classes Fixas (não serão alteradas)",
-            ativos_disponiveis,
+            nomes,
             help="Selecione as classes que devem manter seu valor atual"
         )
         
         # Botão para calcular
         if st.button("🚀 Calcular Rebalanceamento", type="primary", use_container_width=True):
-            # Preparar dados para o cálculo
-            ativos_atuais = {ativo: dados['valor_atual'] for ativo, dados in st.session_state.ativos.items()}
-            percentuais_alvo = {ativo: dados['percentual_alvo'] for ativo, dados in st.session_state.ativos.items()}
+            # Preparar dados para o cálculo: uma passada ordenada já gera as chaves do cache
+            ativos_atuais = []
+            percentuais_alvo = []
+            for ativo, dados in sorted(st.session_state.ativos.items()):
+                ativos_atuais.append((ativo, dados['valor_atual']))
+                percentuais_alvo.append((ativo, dados['percentual_alvo']))
             
             # Realizar cálculo
             with st.spinner("Calculando..."):
-                resultado = calcular_rebalanceamento_otimizado_silencioso(
-                    ativos_atuais=ativos_atuais,
-                    percentuais_alvo=percentuais_alvo,
-                    ativos_fixos=ativos_fixos if ativos_fixos else None
+                resultado = _run_rebalance(
+                    tuple(ativos_atuais),
+                    tuple(percentuais_alvo),
+                    tuple(sorted(ativos_fixos or ()))
                 )
                 st.session_state.resultado = resultado
+                # Guardar as classes fixas usadas neste cálculo para exibir o resultado
+                st.session_state.ativos_fixos = list(ativos_fixos)
             
             st.success("✅ Cálculo realizado!")
 
 # Exibir resultados
 if st.session_state.resultado:
     resultado = st.session_state.resultado
+    acoes = resultado.acoes_por_ativo
+    percentuais_atuais = resultado.percentuais_atuais
+    valores_finais = resultado.valores_finais
+    percentuais_finais = resultado.percentuais_finais
     
     st.markdown("---")
     st.header("📊 Resultados do Rebalanceamento")
     
-    if not resultado['viavel']:
-        st.error(f"❌ **Rebalanceamento não é viável:** {resultado['motivo_inviabilidade']}")
+    if not resultado.viavel:
+        st.error(f"❌ **Rebalanceamento não é viável:** {resultado.motivo_inviabilidade}")
     else:
         # Métricas principais
         col1, col2, col3, col4 = st.columns(4)
@@ -125,56 +169,63 @@ if st.session_state.resultado:
         with col1:
             st.metric(
                 "💰 Patrimônio Atual",
-                f"R$ {resultado['patrimonio_atual']:,.2f}"
+                f"R$ {resultado.patrimonio_atual:,.2f}"
             )
         
         with col2:
             st.metric(
                 "🎯 Patrimônio Alvo",
-                f"R$ {resultado['patrimonio_alvo']:,.2f}",
-                delta=f"R$ {resultado['patrimonio_alvo'] - resultado['patrimonio_atual']:,.2f}"
+                f"R$ {resultado.patrimonio_alvo:,.2f}",
+                delta=f"R$ {resultado.patrimonio_alvo - resultado.patrimonio_atual:,.2f}"
             )
         
         with col3:
             st.metric(
                 "📈 Aporte Necessário",
-                f"R$ {resultado['aporte_necessario']:,.2f}"
+                f"R$ {resultado.aporte_necessario:,.2f}"
             )
         
         with col4:
             st.metric(
                 "💸 Total de Vendas",
-                f"R$ {resultado['total_vendas']:,.2f}"
+                f"R$ {resultado.total_vendas:,.2f}"
             )
         
         # Tabela detalhada dos resultados
         st.subheader("📋 Detalhamento por Ativo")
         
-        # Preparar dados para a tabela
-        dados_tabela = []
-        for ativo in st.session_state.ativos.keys():
-            valor_atual = resultado['patrimonio_atual'] and st.session_state.ativos[ativo]['valor_atual'] or 0
-            percentual_atual = resultado['percentuais_atuais'].get(ativo, 0)
-            percentual_alvo = st.session_state.ativos[ativo]['percentual_alvo']
-            valor_final = resultado['valores_finais'].get(ativo, 0)
-            percentual_final = resultado['percentuais_finais'].get(ativo, 0)
-            acao = resultado['acoes_por_ativo'].get(ativo, 0)
+        # Preparar dados para a tabela e separar compras/vendas na mesma passada
+        fixos_set = frozenset(st.session_state.ativos_fixos)
+        dados_tabela = [None] * len(st.session_state.ativos)
+        compras = []
+        vendas = []
+        fixos = []
+        for i, (ativo, dados) in enumerate(st.session_state.ativos.items()):
+            valor_atual = resultado.patrimonio_atual and dados['valor_atual'] or 0
+            percentual_atual = percentuais_atuais.get(ativo, 0)
+            percentual_alvo = dados['percentual_alvo']
+            valor_final = valores_finais.get(ativo, 0)
+            percentual_final = percentuais_finais.get(ativo, 0)
+            acao = acoes.get(ativo, 0)
             
             # Determinar status e ação
             if acao > 0:
                 acao_str = f"Comprar R$ {acao:,.2f}"
                 status = "📈 Compra"
+                compras.append(ativo)
             elif acao < 0:
                 acao_str = f"Vender R$ {abs(acao):,.2f}"
                 status = "📉 Venda"
-            elif ativo in (ativos_fixos if 'ativos_fixos' in locals() else []):
+                vendas.append(ativo)
+            elif ativo in fixos_set:
+                fixos.append(ativo)
                 acao_str = "Fixo"
                 status = "🔒 Fixo"
             else:
                 acao_str = "Manter"
                 status = "✅ OK"
             
-            dados_tabela.append({
+            dados_tabela[i] = {
                 'Ativo': ativo,
                 'Valor Atual': f"R$ {valor_atual:,.2f}",
                 '% Atual': f"{percentual_atual:.1f}%",
@@ -183,38 +234,38 @@ if st.session_state.resultado:
                 '% Final': f"{percentual_final:.1f}%",
                 'Ação Necessária': acao_str,
                 'Status': status
-            })
-        
-        df_resultado = pd.DataFrame(dados_tabela)
-        
-        # Aplicar cores condicionais
-        def colorir_status(val):
-            if "Compra" in val:
-                return 'background-color: #e8f5e8'
-            elif "Venda" in val:
-                return 'background-color: #ffe8e8'
-            elif "Fixo" in val:
-                return 'background-color: #f0f0f0'
-            else:
-                return 'background-color: #e8f8ff'
+            }
         
-        styled_df = df_resultado.style.applymap(colorir_status, subset=['Status'])
-        st.dataframe(styled_df, use_container_width=True, hide_index=True)
+        # Tabela pré-renderizada em HTML: sem DataFrame/Styler e com cor por status
+        cores_status = {
+            "📈 Compra": '#e8f5e8',
+            "📉 Venda": '#ffe8e8',
+            "🔒 Fixo": '#f0f0f0'
+        }
+        colunas = ('Ativo', 'Valor Atual', '% Atual', '% Alvo', 'Valor Final', '% Final', 'Ação Necessária')
+        cabecalho = ''.join(f'<th>{coluna}</th>' for coluna in colunas) + '<th>Status</th>'
+        linhas = ''.join(
+            '<tr>'
+            + ''.join(f'<td>{html.escape(linha[coluna])}</td>' for coluna in colunas)
+            + f'<td style="background-color: {cores_status.get(linha["Status"], "#e8f8ff")}">{linha["Status"]}</td>'
+            + '</tr>'
+            for linha in dados_tabela
+        )
+        st.markdown(
+            f'<table style="width: 100%"><thead><tr>{cabecalho}</tr></thead><tbody>{linhas}</tbody></table>',
+            unsafe_allow_html=True
+        )
         
         # Resumo das ações
         st.subheader("📝 Resumo das Ações")
         
-        compras = [ativo for ativo, acao in resultado['acoes_por_ativo'].items() if acao > 0]
-        vendas = [ativo for ativo, acao in resultado['acoes_por_ativo'].items() if acao < 0]
-        fixos = ativos_fixos if 'ativos_fixos' in locals() and ativos_fixos else []
-        
         col1, col2, col3 = st.columns(3)
         
         with col1:
             if compras:
                 st.success("📈 **Compras Necessárias:**")
                 for ativo in compras:
-                    valor = resultado['acoes_por_ativo'][ativo]
+                    valor = acoes[ativo]
                     st.write(f"• {ativo}: R$ {valor:,.2f}")
             else:
                 st.info("Nenhuma compra necessária")
@@ -223,7 +274,7 @@ if st.session_state.resultado:
             if vendas:
                 st.warning("📉 **Vendas Necessárias:**")
                 for ativo in vendas:
-                    valor = abs(resultado['acoes_por_ativo'][ativo])
+                    valor = abs(acoes[ativo])
                     st.write(f"• {ativo}: R$ {valor:,.2f}")
             else:
                 st.info("Nenhuma venda necessária")
@@ -238,10 +289,10 @@ if st.session_state.resultado:
                 st.info("Nenhum ativo fixo")
         
         # Verificação de balanço
-        if resultado['aporte_necessario'] <= 0:
+        if resultado.aporte_necessario <= 0:
             st.success("✅ **Rebalanceamento possível apenas com vendas internas!**")
         else:
-            st.info(f"💰 **Aporte externo necessário:** R$ {resultado['aporte_necessario']:,.2f}")
+            st.info(f"💰 **Aporte externo necessário:** R$ {resultado.aporte_necessario:,.2f}")
 
 # Rodapé
 st.markdown("---")
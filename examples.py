@@ -1,14 +1,6 @@
-from script import (
-    calcular_rebalanceamento, 
-    calcular_rebalanceamento_com_fixos,
-    calcular_aporte_necessario_para_alvo,
-    calcular_rebalanceamento_otimizado,
-    validar_ativos_fixos
-)
-
-
 def exemplo_uso_basico():
     """Exemplos básicos de uso das funções de rebalanceamento"""
+    from script import calcular_rebalanceamento
     
     # Exemplo 1: Rebalanceamento sem aporte adicional
     print("EXEMPLO 1: Rebalanceamento sem aporte adicional")
@@ -41,6 +33,7 @@ def exemplo_uso_basico():
 
 def exemplo_uso_com_fixos():
     """Exemplo de uso da função calcular_rebalanceamento_com_fixos"""
+    from script import calcular_rebalanceamento_com_fixos
     
     print("EXEMPLO 3: Rebalanceamento mantendo ITSA4 fixo")
     print("=" * 50)
@@ -83,6 +76,7 @@ def exemplo_uso_com_fixos():
 
 def exemplo_uso_combinacao_invalida():
     """Exemplo que demonstra uma combinação inválida de ativos fixos"""
+    from script import calcular_rebalanceamento_com_fixos
     
     print("\n\nEXEMPLO 4: Tentativa de combinação inválida")
     print("=" * 50)
@@ -115,6 +109,7 @@ def exemplo_uso_combinacao_invalida():
 
 def exemplo_aporte_infinito():
     """Exemplos de cálculo de aporte infinito"""
+    from script import calcular_aporte_necessario_para_alvo
     
     print("EXEMPLO 5: APORTE INFINITO PARA ATINGIR ALVOS")
     print("="*60)
@@ -182,6 +177,7 @@ def exemplo_aporte_infinito():
 
 def exemplo_rebalanceamento_otimizado():
     """Exemplos de rebalanceamento otimizado"""
+    from script import calcular_rebalanceamento_otimizado
     
     print("EXEMPLO 7: Rebalanceamento otimizado sem ativos fixos")
     print("=" * 60)
@@ -232,6 +228,7 @@ def exemplo_rebalanceamento_otimizado():
 
 def exemplo_validacao_ativos_fixos():
     """Exemplo de validação de ativos fixos"""
+    from script import validar_ativos_fixos, calcular_rebalanceamento_com_fixos
     
     print("\n\nEXEMPLO 10: Teste de validação de ativos fixos")
     print("="*60)
@@ -0,0 +1,171 @@
+"""
+Rebalanceamento vetorizado (NumPy) de muitos cenários com as mesmas classes de ativos.
+
+Pensado para backtests com janela deslizante e simulações, em que a mesma alocação alvo
+é avaliada sobre muitas linhas de valores. Cada linha recebe o mesmo tratamento de
+script.calcular_rebalanceamento_otimizado, mas todas são resolvidas de uma vez.
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from script import POSITIVE_INFINITY
+
+
+@dataclass(slots=True, frozen=True)
+class ResultadoLote:
+    """
+    Resultado do rebalanceamento em lote: uma linha por cenário, uma coluna por ativo.
+
+    Cenários com ativos fixos incompatíveis têm patrimônio alvo, aporte, ações e totais
+    zerados e valores/percentuais finais NaN, como os dicionários vazios do cálculo unitário.
+
+    Attributes:
+        viavel (np.ndarray): (N,) Se o rebalanceamento do cenário é possível
+        fixos_compativeis (np.ndarray): (N,) Se os ativos fixos cabem nos percentuais alvo
+        patrimonio_atual (np.ndarray): (N,) Soma dos valores atuais
+        patrimonio_alvo (np.ndarray): (N,) Patrimônio após o rebalanceamento
+        aporte_necessario (np.ndarray): (N,) Aporte externo necessário
+        acoes (np.ndarray): (N, K) +aporte, -venda, 0=fixo
+        valores_finais (np.ndarray): (N, K) Valor final de cada ativo
+        percentuais_atuais (np.ndarray): (N, K) Percentual atual de cada ativo
+        percentuais_finais (np.ndarray): (N, K) Percentual final de cada ativo
+        total_vendas (np.ndarray): (N,) Soma das vendas internas
+        total_aportes_internos (np.ndarray): (N,) Soma das compras internas
+    """
+    viavel: np.ndarray
+    fixos_compativeis: np.ndarray
+    patrimonio_atual: np.ndarray
+    patrimonio_alvo: np.ndarray
+    aporte_necessario: np.ndarray
+    acoes: np.ndarray
+    valores_finais: np.ndarray
+    percentuais_atuais: np.ndarray
+    percentuais_finais: np.ndarray
+    total_vendas: np.ndarray
+    total_aportes_internos: np.ndarray
+
+
+def calcular_rebalanceamento_lote(valores, percentuais_alvo, valor_aporte_disponivel=None, mascara_fixos=None):
+    """
+    Calcula o rebalanceamento otimizado de N cenários de uma vez.
+
+    Args:
+        valores (array-like): Valores atuais, formato (N, K) — um cenário por linha
+        percentuais_alvo (array-like): Percentuais alvo de cada ativo (0-100), formato (K,)
+        valor_aporte_disponivel (float | None): Valor máximo disponível para aporte externo (None = sem limite)
+        mascara_fixos (array-like): Booleanos (K,) marcando os ativos mantidos fixos (opcional)
+
+    Returns:
+        ResultadoLote: Arrays com o resultado de cada cenário
+
+    Raises:
+        ValueError: Se os formatos ou os percentuais alvo forem inválidos, ou se algum
+            ativo fixo tiver percentual alvo zero
+    """
+    valores = np.atleast_2d(np.asarray(valores, dtype=np.float64))
+    percentuais_alvo = np.asarray(percentuais_alvo, dtype=np.float64)
+
+    if valores.ndim != 2 or valores.shape[1] == 0:
+        raise ValueError("'valores' deve ter formato (cenários, ativos) com pelo menos um ativo")
+    if percentuais_alvo.shape != (valores.shape[1],):
+        raise ValueError("'percentuais_alvo' deve ter um percentual por coluna de 'valores'")
+    soma_percentuais = math.fsum(percentuais_alvo)
+    if not math.isclose(soma_percentuais, 100, abs_tol=0.01):  # Tolerância para erros de ponto flutuante
+        raise ValueError(f"A soma dos percentuais alvo deve ser 100%. Atual: {soma_percentuais}%")
+
+    if mascara_fixos is None:
+        fixos = np.zeros(valores.shape[1], dtype=bool)
+    else:
+        fixos = np.asarray(mascara_fixos, dtype=bool)
+        if fixos.shape != percentuais_alvo.shape:
+            raise ValueError("'mascara_fixos' deve ter um booleano por ativo")
+        # Os fixos definem o patrimônio alvo (valor / fração): um alvo de 0% não o determina
+        if (percentuais_alvo[fixos] <= 0).any():
+            raise ValueError("Ativos fixos devem ter percentual alvo maior que zero")
+
+    if valor_aporte_disponivel == POSITIVE_INFINITY:
+        valor_aporte_disponivel = None
+
+    fracoes_alvo = percentuais_alvo / 100
+    patrimonio_atual = valores.sum(axis=1)
+
+    # Percentuais atuais (0 quando o patrimônio do cenário é nulo)
+    fator = np.divide(100, patrimonio_atual, out=np.zeros_like(patrimonio_atual), where=patrimonio_atual > 0)
+    percentuais_atuais = valores * fator[:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if fixos.any():
+            # Fixos compatíveis: ocupam hoje o mesmo percentual que o alvo lhes reserva
+            percentual_alvo_fixos = percentuais_alvo[fixos].sum()
+            percentual_alvo_variaveis = percentuais_alvo[~fixos].sum()
+            fixos_compativeis = (
+                (np.abs(percentuais_atuais[:, fixos].sum(axis=1) - percentual_alvo_fixos) <= 0.01)
+                & (abs(percentual_alvo_variaveis - (100 - percentual_alvo_fixos)) <= 0.01)
+            )
+            # Os fixos definem o patrimônio: o maior valor / fração entre eles
+            patrimonio_alvo = (valores[:, fixos] / fracoes_alvo[fixos]).max(axis=1)
+        else:
+            fixos_compativeis = np.ones(valores.shape[0], dtype=bool)
+            # Mesmo critério de _verificar_viabilidade_patrimonio; senão, o menor candidato
+            soma_fracoes = fracoes_alvo.sum()
+            positivos = fracoes_alvo > 0
+            patrimonio_alvo = np.where(
+                patrimonio_atual * soma_fracoes <= patrimonio_atual * (1 + 1e-9),
+                patrimonio_atual,
+                (valores[:, positivos] / fracoes_alvo[positivos]).min(axis=1)
+            )
+
+        valores_finais = np.where(fixos, valores, fracoes_alvo * patrimonio_alvo[:, None])
+        percentuais_finais = np.where(fixos, valores / patrimonio_alvo[:, None] * 100, percentuais_alvo)
+
+    acoes = valores_finais - valores  # Fixos: exatamente 0
+
+    # Cenários já no alvo (mesma tolerância de math.isclose(..., abs_tol=0.01)): nenhuma ação
+    tolerancia = np.maximum(1e-9 * np.maximum(np.abs(valores_finais), np.abs(valores)), 0.01)
+    no_alvo = (np.abs(acoes) <= tolerancia).all(axis=1)
+    acoes[no_alvo | ~fixos_compativeis] = 0
+    # No alvo: o resultado descreve a carteira como ela está
+    patrimonio_alvo[no_alvo] = patrimonio_atual[no_alvo]
+    valores_finais[no_alvo] = valores[no_alvo]
+    percentuais_finais[no_alvo] = percentuais_atuais[no_alvo]
+
+    total_aportes_internos = np.where(acoes > 0, acoes, 0).sum(axis=1)
+    total_vendas = np.where(acoes < 0, -acoes, 0).sum(axis=1)
+    # Compras e vendas que diferem só por arredondamento se anulam (mesma tolerância do script)
+    aporte_necessario = np.where(
+        _isclose(total_aportes_internos, total_vendas), 0.0, total_aportes_internos - total_vendas
+    )
+
+    viavel = fixos_compativeis
+    if valor_aporte_disponivel is not None:
+        viavel = viavel & ((aporte_necessario <= valor_aporte_disponivel)
+                           | _isclose(aporte_necessario, valor_aporte_disponivel))
+    aporte_necessario = np.where(viavel, np.maximum(aporte_necessario, 0), aporte_necessario)
+
+    # Fixos incompatíveis: sem solução para o cenário
+    patrimonio_alvo[~fixos_compativeis] = 0
+    valores_finais[~fixos_compativeis] = np.nan
+    percentuais_finais[~fixos_compativeis] = np.nan
+
+    return ResultadoLote(
+        viavel=viavel,
+        fixos_compativeis=fixos_compativeis,
+        patrimonio_atual=patrimonio_atual,
+        patrimonio_alvo=patrimonio_alvo,
+        aporte_necessario=aporte_necessario,
+        acoes=acoes,
+        valores_finais=valores_finais,
+        percentuais_atuais=percentuais_atuais,
+        percentuais_finais=percentuais_finais,
+        total_vendas=total_vendas,
+        total_aportes_internos=total_aportes_internos
+    )
+
+
+def _isclose(a, b):
+    """
+    Equivalente vetorizado de math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9).
+    """
+    return np.abs(a - b) <= np.maximum(1e-9 * np.maximum(np.abs(a), np.abs(b)), 1e-9)
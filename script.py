@@ -1,5 +1,55 @@
+import math
+import sys
+from dataclasses import asdict, dataclass, replace
+from functools import lru_cache
+
 POSITIVE_INFINITY = float('inf')
 
+# Cabeçalho fixo e template das linhas da tabela exibida por _exibir_resultado_otimizado
+_CABECALHO_TABELA = (
+    f"{'Ativo':<15} {'Atual':<12} {'%Atual':<8} {'%Alvo':<8} {'Alvo':<12} {'%Final':<8} {'Ação':<15} {'Status':<10}\n"
+    + "-" * 110
+)
+_FORMATO_LINHA = "{:<15} R$ {:<10.2f} {:<7.1f}% {:<7.1f}% R$ {:<10.2f} {:<7.1f}% {:<15} {}"
+
+
+@dataclass(slots=True, frozen=True)
+class ResultadoRebalanceamento:
+    """
+    Resultado do rebalanceamento otimizado.
+    
+    Attributes:
+        viavel (bool): Se o rebalanceamento é possível
+        motivo_inviabilidade (str): Motivo quando não é viável (None se viável)
+        patrimonio_atual (float): Soma dos valores atuais
+        patrimonio_alvo (float): Patrimônio após o rebalanceamento
+        aporte_necessario (float): Aporte externo necessário
+        acoes_por_ativo (dict): +aporte, -venda, 0=fixo
+        valores_finais (dict): Valor final de cada ativo
+        percentuais_atuais (dict): Percentual atual de cada ativo
+        percentuais_finais (dict): Percentual final de cada ativo
+        total_vendas (float): Soma das vendas internas
+        total_aportes_internos (float): Soma das compras internas
+    """
+    viavel: bool
+    motivo_inviabilidade: str | None
+    patrimonio_atual: float
+    patrimonio_alvo: float
+    aporte_necessario: float
+    acoes_por_ativo: dict
+    valores_finais: dict
+    percentuais_atuais: dict
+    percentuais_finais: dict
+    total_vendas: float
+    total_aportes_internos: float
+    
+    def to_dict(self):
+        """
+        Converte o resultado para o formato de dicionário usado anteriormente.
+        """
+        return asdict(self)
+
+
 def validar_entradas(ativos_atuais, percentuais_alvo):
     """
     Valida as entradas da função de rebalanceamento.
@@ -14,39 +64,37 @@ def validar_entradas(ativos_atuais, percentuais_alvo):
     if not ativos_atuais or not percentuais_alvo:
         raise ValueError("Ativos atuais e percentuais alvo não podem estar vazios")
     
-    # Verificar se os ativos coincidem
-    ativos_atual_set = set(ativos_atuais.keys())
-    ativos_alvo_set = set(percentuais_alvo.keys())
-    
-    if ativos_atual_set != ativos_alvo_set:
+    # Verificar se os ativos coincidem (views de chaves comparam como conjuntos, sem copiá-las)
+    if ativos_atuais.keys() != percentuais_alvo.keys():
         raise ValueError("Os ativos em 'ativos_atuais' devem coincidir com os em 'percentuais_alvo'")
     
     # Verificar se a soma dos percentuais alvo é 100%
-    soma_percentuais = sum(percentuais_alvo.values())
-    if abs(soma_percentuais - 100) > 0.01:  # Tolerância para erros de ponto flutuante
+    soma_percentuais = math.fsum(percentuais_alvo.values())
+    if not math.isclose(soma_percentuais, 100, abs_tol=0.01):  # Tolerância para erros de ponto flutuante
         raise ValueError(f"A soma dos percentuais alvo deve ser 100%. Atual: {soma_percentuais}%")
 
 
-def calcular_percentuais_atuais(ativos_atuais):
+def calcular_percentuais_atuais(ativos_atuais, patrimonio_atual=None):
     """
     Calcula os percentuais atuais de cada ativo na carteira.
     
     Args:
         ativos_atuais (dict): Dicionário com ativos e seus valores atuais
+        patrimonio_atual (float): Soma dos valores atuais, se já calculada (opcional)
     
     Returns:
         dict: Dicionário com percentuais atuais de cada ativo
     """
-    patrimonio_atual = sum(ativos_atuais.values())
-    percentuais_atuais = {}
-    
-    for ativo, valor in ativos_atuais.items():
-        percentuais_atuais[ativo] = (valor / patrimonio_atual) * 100 if patrimonio_atual > 0 else 0
+    if patrimonio_atual is None:
+        patrimonio_atual = math.fsum(ativos_atuais.values())
+    if patrimonio_atual <= 0:
+        return {ativo: 0 for ativo in ativos_atuais}
     
-    return percentuais_atuais
+    fator = 100 / patrimonio_atual  # Uma divisão; por ativo, só multiplicação
+    return {ativo: valor * fator for ativo, valor in ativos_atuais.items()}
 
 
-def validar_ativos_fixos(ativos_atuais, ativos_fixos, percentuais_alvo):
+def validar_ativos_fixos(ativos_atuais, ativos_fixos, percentuais_alvo, patrimonio_atual=None):
     """
     Valida se é possível manter os ativos fixos com os percentuais desejados.
     
@@ -54,6 +102,7 @@ def validar_ativos_fixos(ativos_atuais, ativos_fixos, percentuais_alvo):
         ativos_atuais (dict): Valores atuais dos ativos
         ativos_fixos (list): Lista de ativos que devem ser mantidos fixos
         percentuais_alvo (dict): Percentuais alvo de cada ativo
+        patrimonio_atual (float): Soma dos valores atuais, se já calculada (opcional)
     
     Returns:
         tuple: (is_valid, error_message, patrimonio_disponivel_percentual)
@@ -68,17 +117,17 @@ def validar_ativos_fixos(ativos_atuais, ativos_fixos, percentuais_alvo):
         if ativo not in percentuais_alvo:
             return False, f"Ativo fixo '{ativo}' não tem percentual alvo definido", 0
     
-    patrimonio_total = sum(ativos_atuais.values())
+    patrimonio_total = math.fsum(ativos_atuais.values()) if patrimonio_atual is None else patrimonio_atual
     
     # Calcular percentual ocupado pelos ativos fixos
-    valor_ativos_fixos = sum(ativos_atuais[ativo] for ativo in ativos_fixos)
+    valor_ativos_fixos = math.fsum(ativos_atuais[ativo] for ativo in ativos_fixos)
     percentual_ativos_fixos = (valor_ativos_fixos / patrimonio_total) * 100 if patrimonio_total > 0 else 0
     
     # Calcular percentual alvo dos ativos fixos
-    percentual_alvo_fixos = sum(percentuais_alvo[ativo] for ativo in ativos_fixos)
+    percentual_alvo_fixos = math.fsum(percentuais_alvo[ativo] for ativo in ativos_fixos)
     
     # Verificar se os percentuais dos ativos fixos são compatíveis
-    if abs(percentual_ativos_fixos - percentual_alvo_fixos) > 0.01:
+    if not math.isclose(percentual_ativos_fixos, percentual_alvo_fixos, abs_tol=0.01):
         return False, (f"Incompatibilidade: ativos fixos ocupam {percentual_ativos_fixos:.2f}% "
                       f"mas o alvo é {percentual_alvo_fixos:.2f}%"), 0
     
@@ -86,17 +135,18 @@ def validar_ativos_fixos(ativos_atuais, ativos_fixos, percentuais_alvo):
     percentual_disponivel = 100 - percentual_alvo_fixos
     
     # Verificar se sobra espaço para os outros ativos
-    ativos_variaveis = [ativo for ativo in ativos_atuais.keys() if ativo not in ativos_fixos]
-    percentual_alvo_variaveis = sum(percentuais_alvo[ativo] for ativo in ativos_variaveis)
+    fixos_set = frozenset(ativos_fixos)
+    percentual_alvo_variaveis = math.fsum(percentuais_alvo[ativo] for ativo in ativos_atuais if ativo not in fixos_set)
     
-    if abs(percentual_alvo_variaveis - percentual_disponivel) > 0.01:
+    if not math.isclose(percentual_alvo_variaveis, percentual_disponivel, abs_tol=0.01):
         return False, (f"Incompatibilidade: ativos variáveis precisam de {percentual_alvo_variaveis:.2f}% "
                       f"mas só há {percentual_disponivel:.2f}% disponível"), 0
     
     return True, None, percentual_disponivel
 
 
-def calcular_rebalanceamento_otimizado(ativos_atuais, percentuais_alvo, valor_aporte_disponivel=POSITIVE_INFINITY, ativos_fixos=None):
+def calcular_rebalanceamento_otimizado(ativos_atuais, percentuais_alvo, valor_aporte_disponivel=None, ativos_fixos=None,
+                                       verbose=True):
     """
     Calcula o rebalanceamento otimizado para atingir os percentuais alvo com o menor aporte possível.
     Permite vendas de ativos não fixos para reduzir a necessidade de aportes externos.
@@ -104,221 +154,229 @@ def calcular_rebalanceamento_otimizado(ativos_atuais, percentuais_alvo, valor_ap
     Args:
         ativos_atuais (dict): Valores atuais dos ativos
         percentuais_alvo (dict): Percentuais alvo de cada ativo (0-100)
-        valor_aporte_disponivel (float): Valor máximo disponível para aporte externo
+        valor_aporte_disponivel (float | None): Valor máximo disponível para aporte externo (None = sem limite)
         ativos_fixos (list): Lista de ativos que devem ser mantidos fixos (opcional)
+        verbose (bool): Se True, exibe o cálculo e a tabela de resultados no stdout
     
     Returns:
-        dict: {
-            'patrimonio_alvo': float,
-            'aporte_necessario': float,
-            'acoes_por_ativo': dict,  # +aporte, -venda, 0=fixo
-            'valores_finais': dict,
-            'percentuais_finais': dict,
-            'total_vendas': float,
-            'total_aportes_internos': float,
-            'viavel': bool,
-            'motivo_inviabilidade': str
-        }
+        ResultadoRebalanceamento: Resultado do cálculo (use .to_dict() para obter um dict)
     """
     # Validar entradas
     validar_entradas(ativos_atuais, percentuais_alvo)
     
-    patrimonio_atual = sum(ativos_atuais.values())
+    # Aporte ilimitado é representado por None (POSITIVE_INFINITY aceito por compatibilidade)
+    if valor_aporte_disponivel == POSITIVE_INFINITY:
+        valor_aporte_disponivel = None
+    
+    # Soma compensada, calculada uma vez e repassada às validações e ao cálculo
+    patrimonio_atual = math.fsum(ativos_atuais.values())
     ativos_fixos = ativos_fixos or []
+    fixos_set = frozenset(ativos_fixos)
     
     # Validar ativos fixos
     if ativos_fixos:
-        is_valid, error_msg, _ = validar_ativos_fixos(ativos_atuais, ativos_fixos, percentuais_alvo)
+        is_valid, error_msg, _ = validar_ativos_fixos(ativos_atuais, ativos_fixos, percentuais_alvo,
+                                                      patrimonio_atual)
         if not is_valid:
-            return {
-                'viavel': False,
-                'motivo_inviabilidade': f"Classe de ativos fixos incompatíveis: {error_msg}",
-                'patrimonio_alvo': 0,
-                'aporte_necessario': 0,
-                'acoes_por_ativo': {},
-                'valores_finais': {},
-                'percentuais_finais': {},
-                'total_vendas': 0,
-                'total_aportes_internos': 0
-            }
-    
-    print(f"REBALANCEAMENTO OTIMIZADO")
-    print("=" * 45)
-    print(f"Patrimônio atual: R$ {patrimonio_atual:,.2f}")
-    if valor_aporte_disponivel != POSITIVE_INFINITY:
-        print(f"Aporte disponível: R$ {valor_aporte_disponivel:,.2f}")
-    if ativos_fixos:
-        print(f"Classe de ativos fixos: {', '.join(ativos_fixos)}")
-    print("Estratégia: Vendas + aportes otimizados")
-    print()
-    
-    # 1. Calcular patrimônio alvo mínimo
-    patrimonio_alvo = _calcular_patrimonio_alvo_minimo(ativos_atuais, percentuais_alvo, ativos_fixos)
-    
-    # 2. Calcular valores alvo para cada ativo
+            return ResultadoRebalanceamento(
+                viavel=False,
+                motivo_inviabilidade=f"Classes incompatíveis: {error_msg}",
+                patrimonio_atual=patrimonio_atual,
+                patrimonio_alvo=0,
+                aporte_necessario=0,
+                acoes_por_ativo={},
+                valores_finais={},
+                percentuais_atuais={},
+                percentuais_finais={},
+                total_vendas=0,
+                total_aportes_internos=0
+            )
+    
+    if verbose:
+        linhas = [
+            "REBALANCEAMENTO OTIMIZADO",
+            "=" * 45,
+            f"Patrimônio atual: R$ {patrimonio_atual:,.2f}"
+        ]
+        if valor_aporte_disponivel is not None:
+            linhas.append(f"Aporte disponível: R$ {valor_aporte_disponivel:,.2f}")
+        if ativos_fixos:
+            linhas.append(f"Classe de ativos fixos: {', '.join(ativos_fixos)}")
+        linhas.append("Estratégia: Vendas + aportes otimizados")
+        linhas.append("")
+        _emit("\n".join(linhas))
+    
+    # Percentuais atuais calculados uma única vez e reaproveitados em todos os caminhos
+    percentuais_atuais = calcular_percentuais_atuais(ativos_atuais, patrimonio_atual)
+    
+    # 1. Calcular patrimônio alvo mínimo (frações alvo convertidas uma vez e reaproveitadas)
+    fracoes_alvo = _fracoes_alvo(percentuais_alvo)
+    patrimonio_alvo = _calcular_patrimonio_alvo_minimo(ativos_atuais, percentuais_alvo, ativos_fixos,
+                                                       patrimonio_atual, fracoes_alvo)
+    
+    # 2. Calcular, numa única passada, valor alvo, ação e percentual final de cada ativo
     valores_alvo = {}
-    for ativo, perc_alvo in percentuais_alvo.items():
-        if ativo in ativos_fixos:
-            valores_alvo[ativo] = ativos_atuais[ativo]  # Manter fixo
-        else:
-            valores_alvo[ativo] = (perc_alvo / 100) * patrimonio_alvo
-    
-    # 3. Calcular ações necessárias
     acoes_por_ativo = {}
+    percentuais_finais = {}
     total_aportes_internos = 0
     total_vendas = 0
+    no_alvo = True
     
     for ativo, valor_atual in ativos_atuais.items():
-        valor_alvo = valores_alvo[ativo]
+        if ativo in fixos_set:
+            # Manter fixo
+            valores_alvo[ativo] = valor_atual
+            acoes_por_ativo[ativo] = 0
+            percentuais_finais[ativo] = (valor_atual / patrimonio_alvo) * 100
+            continue
         
-        if ativo in ativos_fixos:
-            acoes_por_ativo[ativo] = 0  # Manter fixo
-        elif valor_alvo > valor_atual:
-            # Precisa de aporte
-            aporte_necessario = valor_alvo - valor_atual
-            acoes_por_ativo[ativo] = aporte_necessario
-            total_aportes_internos += aporte_necessario
-        elif valor_alvo < valor_atual:
-            # Pode ser vendido
-            venda_possivel = valor_atual - valor_alvo
-            acoes_por_ativo[ativo] = -venda_possivel
-            total_vendas += venda_possivel
-        else:
-            acoes_por_ativo[ativo] = 0  # Já no alvo
+        valor_alvo = fracoes_alvo[ativo] * patrimonio_alvo
+        acao = valor_alvo - valor_atual  # > 0: aporte, < 0: venda, 0: já no alvo
+        valores_alvo[ativo] = valor_alvo
+        acoes_por_ativo[ativo] = acao
+        # Fora dos fixos, o percentual final é o próprio alvo (valor_alvo / patrimonio_alvo)
+        percentuais_finais[ativo] = percentuais_alvo[ativo]
+        if acao > 0:
+            total_aportes_internos += acao
+        elif acao < 0:
+            total_vendas -= acao
+        no_alvo = no_alvo and math.isclose(valor_alvo, valor_atual, abs_tol=0.01)
+    
+    # 3. Carteira já no alvo (dentro da tolerância): nenhuma ação necessária, e o
+    #    resultado descreve a carteira como ela está
+    if no_alvo:
+        patrimonio_alvo = patrimonio_atual
+        valores_alvo = dict(ativos_atuais)
+        percentuais_finais = dict(percentuais_atuais)
+        acoes_por_ativo = dict.fromkeys(ativos_atuais, 0)
+        total_aportes_internos = 0
+        total_vendas = 0
     
     # 4. Verificar viabilidade
-    aporte_necessario = total_aportes_internos - total_vendas
-    
-    if valor_aporte_disponivel != POSITIVE_INFINITY and aporte_necessario > valor_aporte_disponivel:
-        return {
-            'viavel': False,
-            'motivo_inviabilidade': f"Aporte necessário (R$ {aporte_necessario:,.2f}) excede disponível (R$ {valor_aporte_disponivel:,.2f})",
-            'patrimonio_alvo': patrimonio_alvo,
-            'aporte_necessario': aporte_necessario,
-            'acoes_por_ativo': acoes_por_ativo,
-            'valores_finais': valores_alvo,
-            'percentuais_finais': {ativo: (valor / patrimonio_alvo) * 100 for ativo, valor in valores_alvo.items()},
-            'total_vendas': total_vendas,
-            'total_aportes_internos': total_aportes_internos
-        }
-    
-    # 5. Calcular percentuais finais
-    percentuais_finais = {}
-    for ativo, valor_final in valores_alvo.items():
-        percentuais_finais[ativo] = (valor_final / patrimonio_alvo) * 100
-    
-    # 6. Exibir resultados
-    _exibir_resultado_otimizado(ativos_atuais, percentuais_alvo, valores_alvo, 
-                               acoes_por_ativo, percentuais_finais, patrimonio_alvo,
-                               aporte_necessario, total_vendas, total_aportes_internos, ativos_fixos)
-    
-    return {
-        'viavel': True,
-        'motivo_inviabilidade': None,
-        'patrimonio_alvo': patrimonio_alvo,
-        'aporte_necessario': max(0, aporte_necessario),  # Não pode ser negativo
-        'acoes_por_ativo': acoes_por_ativo,
-        'valores_finais': valores_alvo,
-        'percentuais_finais': percentuais_finais,
-        'total_vendas': total_vendas,
-        'total_aportes_internos': total_aportes_internos
-    }
+    # O patrimônio alvo em forma fechada aceita a mesma tolerância relativa de
+    # _verificar_viabilidade_patrimonio: compras e vendas que diferem só por
+    # arredondamento se anulam, e o limite de aporte é comparado com essa folga
+    if math.isclose(total_aportes_internos, total_vendas, rel_tol=1e-9, abs_tol=1e-9):
+        aporte_necessario = 0
+    else:
+        aporte_necessario = total_aportes_internos - total_vendas
+    
+    if (valor_aporte_disponivel is not None and aporte_necessario > valor_aporte_disponivel
+            and not math.isclose(aporte_necessario, valor_aporte_disponivel, rel_tol=1e-9, abs_tol=1e-9)):
+        return ResultadoRebalanceamento(
+            viavel=False,
+            motivo_inviabilidade=f"Aporte necessário (R$ {aporte_necessario:,.2f}) excede disponível (R$ {valor_aporte_disponivel:,.2f})",
+            patrimonio_atual=patrimonio_atual,
+            patrimonio_alvo=patrimonio_alvo,
+            aporte_necessario=aporte_necessario,
+            acoes_por_ativo=acoes_por_ativo,
+            valores_finais=valores_alvo,
+            percentuais_atuais=percentuais_atuais,
+            percentuais_finais=percentuais_finais,
+            total_vendas=total_vendas,
+            total_aportes_internos=total_aportes_internos
+        )
+    
+    # 5. Exibir resultados
+    if verbose:
+        _exibir_resultado_otimizado(ativos_atuais, percentuais_alvo, valores_alvo, 
+                                   acoes_por_ativo, percentuais_atuais, percentuais_finais, patrimonio_alvo,
+                                   aporte_necessario, total_vendas, total_aportes_internos, fixos_set)
+    
+    return ResultadoRebalanceamento(
+        viavel=True,
+        motivo_inviabilidade=None,
+        patrimonio_atual=patrimonio_atual,
+        patrimonio_alvo=patrimonio_alvo,
+        aporte_necessario=max(0, aporte_necessario),  # Não pode ser negativo
+        acoes_por_ativo=acoes_por_ativo,
+        valores_finais=valores_alvo,
+        percentuais_atuais=percentuais_atuais,
+        percentuais_finais=percentuais_finais,
+        total_vendas=total_vendas,
+        total_aportes_internos=total_aportes_internos
+    )
 
 
-def _calcular_patrimonio_alvo_minimo(ativos_atuais, percentuais_alvo, ativos_fixos):
+def _emit(texto):
+    """
+    Escreve no stdout um bloco de texto já montado, com uma única chamada de escrita.
+    """
+    sys.stdout.write(texto + "\n")
+
+
+def _fracoes_alvo(percentuais_alvo):
+    """
+    Converte os percentuais alvo (0-100) em frações (0-1), uma única vez por cálculo.
+    """
+    return {ativo: perc_alvo / 100 for ativo, perc_alvo in percentuais_alvo.items()}
+
+
+def _calcular_patrimonio_alvo_minimo(ativos_atuais, percentuais_alvo, ativos_fixos, patrimonio_atual=None,
+                                     fracoes_alvo=None):
     """
     Calcula o patrimônio alvo mínimo otimizado, considerando vendas e compras
     para encontrar a solução mais próxima do patrimônio atual.
     """
-    patrimonio_atual = sum(ativos_atuais.values())
+    if patrimonio_atual is None:
+        patrimonio_atual = math.fsum(ativos_atuais.values())
     ativos_fixos = ativos_fixos or []
+    if fracoes_alvo is None:
+        fracoes_alvo = _fracoes_alvo(percentuais_alvo)
     
     # 1. Se há ativos fixos, eles definem restrições rígidas
     if ativos_fixos:
         patrimonio_minimo_fixos = 0
         for ativo in ativos_fixos:
-            valor_atual = ativos_atuais[ativo]
-            perc_alvo = percentuais_alvo[ativo]
-            patrimonio_necessario = valor_atual / (perc_alvo / 100)
+            patrimonio_necessario = ativos_atuais[ativo] / fracoes_alvo[ativo]
             patrimonio_minimo_fixos = max(patrimonio_minimo_fixos, patrimonio_necessario)
         return patrimonio_minimo_fixos
     
     # 2. Se não há ativos fixos, otimizar para o menor patrimônio possível
-    # Testar diferentes cenários de patrimônio alvo
+    soma_fracoes = math.fsum(fracoes_alvo.values())
     
     # Cenário 1: Patrimônio atual (sem aportes externos)
-    if _verificar_viabilidade_patrimonio(ativos_atuais, percentuais_alvo, patrimonio_atual):
+    if _verificar_viabilidade_patrimonio(patrimonio_atual, soma_fracoes, patrimonio_atual):
         return patrimonio_atual
     
-    # Cenário 2: Para cada ativo, calcular o patrimônio se ele não for vendido
-    candidatos_patrimonio = []
-    
-    for ativo, valor_atual in ativos_atuais.items():
-        perc_alvo = percentuais_alvo[ativo]
-        patrimonio_candidato = valor_atual / (perc_alvo / 100)
-        
-        # Verificar se este patrimônio candidato é viável para todos os ativos
-        if _verificar_viabilidade_patrimonio(ativos_atuais, percentuais_alvo, patrimonio_candidato):
-            candidatos_patrimonio.append(patrimonio_candidato)
-    
-    # Escolher o menor patrimônio viável
-    if candidatos_patrimonio:
-        return min(candidatos_patrimonio)
-    
-    # Fallback: se nenhum cenário individual funciona, usar o maior necessário
-    patrimonios_necessarios = []
-    for ativo, valor_atual in ativos_atuais.items():
-        perc_alvo = percentuais_alvo[ativo]
-        patrimonio_necessario = valor_atual / (perc_alvo / 100)
-        patrimonios_necessarios.append(patrimonio_necessario)
-    
-    return min(patrimonios_necessarios)
+    # Cenário 2: patrimônio em que algum ativo fica exatamente no alvo sem ser vendido.
+    # A viabilidade é monótona em W, então o menor candidato viável (ou, se nenhum for
+    # viável, o fallback) é sempre o menor candidato: basta uma passada.
+    return min(valor_atual / fracoes_alvo[ativo]
+               for ativo, valor_atual in ativos_atuais.items() if fracoes_alvo[ativo] > 0)
 
 
-def _verificar_viabilidade_patrimonio(ativos_atuais, percentuais_alvo, patrimonio_teste):
+def _verificar_viabilidade_patrimonio(patrimonio_atual, soma_fracoes, patrimonio_teste):
     """
     Verifica se é possível atingir os percentuais alvo com o patrimônio dado,
     considerando que ativos só podem ser vendidos (não podem ter valor aumentado sem aporte).
-    """
-    total_vendas_possiveis = 0
-    total_compras_necessarias = 0
     
-    for ativo, valor_atual in ativos_atuais.items():
-        perc_alvo = percentuais_alvo[ativo]
-        valor_alvo = (perc_alvo / 100) * patrimonio_teste
-        
-        if valor_alvo > valor_atual:
-            # Precisa comprar (aporte necessário)
-            total_compras_necessarias += (valor_alvo - valor_atual)
-        elif valor_alvo < valor_atual:
-            # Pode vender
-            total_vendas_possiveis += (valor_atual - valor_alvo)
-        # Se valor_alvo == valor_atual, não há ação necessária
-    
-    # É viável se as vendas cobrem as compras (sem aporte externo)
-    return total_vendas_possiveis >= total_compras_necessarias
+    As vendas cobrem as compras quando a soma de (valor_atual - fração_alvo * patrimônio_teste)
+    não é negativa, ou seja, quando patrimônio_teste * soma_fracoes <= patrimônio_atual.
+    A tolerância relativa absorve o arredondamento da soma das frações, que de outra forma
+    tornaria o próprio patrimônio atual inviável quando os alvos somam 100%.
+    """
+    return patrimonio_teste * soma_fracoes <= patrimonio_atual * (1 + 1e-9)
 
 
 def _exibir_resultado_otimizado(ativos_atuais, percentuais_alvo, valores_alvo, 
-                               acoes_por_ativo, percentuais_finais, patrimonio_alvo,
-                               aporte_necessario, total_vendas, total_aportes_internos, ativos_fixos):
+                               acoes_por_ativo, percentuais_atuais, percentuais_finais, patrimonio_alvo,
+                               aporte_necessario, total_vendas, total_aportes_internos, fixos_set):
     """
     Exibe os resultados do rebalanceamento otimizado de forma organizada.
+    O relatório é montado em memória e escrito de uma vez no final.
     """
-    percentuais_atuais = calcular_percentuais_atuais(ativos_atuais)
-    
-    print(f"{'Ativo':<15} {'Atual':<12} {'%Atual':<8} {'%Alvo':<8} {'Alvo':<12} {'%Final':<8} {'Ação':<15} {'Status':<10}")
-    print("-" * 110)
-    
-    for ativo in ativos_atuais.keys():
-        valor_atual = ativos_atuais[ativo]
-        percentual_atual = percentuais_atuais[ativo]
+    linhas = [_CABECALHO_TABELA]
+    formatar_linha = _FORMATO_LINHA.format
+    
+    # Os dicionários calculados foram montados na ordem de ativos_atuais: percorrê-los
+    # em paralelo, por posição, dispensa uma busca por nome em cada um deles
+    for (ativo, valor_atual), percentual_atual, valor_alvo, percentual_final, acao in zip(
+            ativos_atuais.items(), percentuais_atuais.values(), valores_alvo.values(),
+            percentuais_finais.values(), acoes_por_ativo.values()):
         percentual_alvo = percentuais_alvo[ativo]
-        valor_alvo = valores_alvo[ativo]
-        percentual_final = percentuais_finais[ativo]
-        acao = acoes_por_ativo[ativo]
         
-        if ativo in ativos_fixos:
+        if ativo in fixos_set:
             acao_str = "FIXO"
             status = "🔒 FIXO"
         elif acao > 0:
@@ -331,130 +389,72 @@ def _exibir_resultado_otimizado(ativos_atuais, percentuais_alvo, valores_alvo,
             acao_str = "Manter"
             status = "✅ OK"
         
-        print(f"{ativo:<15} R$ {valor_atual:<10.2f} {percentual_atual:<7.1f}% {percentual_alvo:<7.1f}% "
-              f"R$ {valor_alvo:<10.2f} {percentual_final:<7.1f}% {acao_str:<15} {status}")
+        linhas.append(formatar_linha(ativo, valor_atual, percentual_atual, percentual_alvo,
+                                     valor_alvo, percentual_final, acao_str, status))
     
-    print("-" * 110)
-    print(f"Patrimônio alvo: R$ {patrimonio_alvo:,.2f}")
-    print(f"Total de vendas internas: R$ {total_vendas:,.2f}")
-    print(f"Total de compras internas: R$ {total_aportes_internos:,.2f}")
-    print(f"Aporte externo necessário: R$ {max(0, aporte_necessario):,.2f}")
+    linhas.append("-" * 110)
+    linhas.append(f"Patrimônio alvo: R$ {patrimonio_alvo:,.2f}")
+    linhas.append(f"Total de vendas internas: R$ {total_vendas:,.2f}")
+    linhas.append(f"Total de compras internas: R$ {total_aportes_internos:,.2f}")
+    linhas.append(f"Aporte externo necessário: R$ {max(0, aporte_necessario):,.2f}")
     
     if aporte_necessario <= 0:
-        print("✅ Rebalanceamento possível apenas com vendas internas!")
+        linhas.append("✅ Rebalanceamento possível apenas com vendas internas!")
     else:
-        print(f"💰 Aporte externo de R$ {aporte_necessario:,.2f} necessário")
+        linhas.append(f"💰 Aporte externo de R$ {aporte_necessario:,.2f} necessário")
+    
+    _emit("\n".join(linhas))
 
 
-def calcular_rebalanceamento_otimizado_silencioso(ativos_atuais, percentuais_alvo, valor_aporte_disponivel=POSITIVE_INFINITY, ativos_fixos=None):
+def calcular_rebalanceamento_otimizado_silencioso(ativos_atuais, percentuais_alvo, valor_aporte_disponivel=None, ativos_fixos=None):
     """
     Versão silenciosa da função calcular_rebalanceamento_otimizado (sem prints).
     Calcula o rebalanceamento otimizado para atingir os percentuais alvo com o menor aporte possível.
     
+    O cálculo é determinístico, então os resultados são memorizados por entrada. Cada
+    chamada recebe dicionários novos, na ordem das chaves de ativos_atuais, e pode
+    alterá-los sem afetar as chamadas seguintes.
+    
     Args:
         ativos_atuais (dict): Valores atuais dos ativos
         percentuais_alvo (dict): Percentuais alvo de cada ativo (0-100)
-        valor_aporte_disponivel (float): Valor máximo disponível para aporte externo
+        valor_aporte_disponivel (float | None): Valor máximo disponível para aporte externo (None = sem limite)
         ativos_fixos (list): Lista de ativos que devem ser mantidos fixos (opcional)
     
     Returns:
-        dict: Resultado do cálculo com informações detalhadas
+        ResultadoRebalanceamento: Resultado do cálculo com informações detalhadas
     """
-    # Validar entradas
-    validar_entradas(ativos_atuais, percentuais_alvo)
-    
-    patrimonio_atual = sum(ativos_atuais.values())
-    ativos_fixos = ativos_fixos or []
-    
-    # Validar ativos fixos
-    if ativos_fixos:
-        is_valid, error_msg, _ = validar_ativos_fixos(ativos_atuais, ativos_fixos, percentuais_alvo)
-        if not is_valid:
-            return {
-                'viavel': False,
-                'motivo_inviabilidade': f"Classes incompatíveis: {error_msg}",
-                'patrimonio_atual': patrimonio_atual,
-                'patrimonio_alvo': 0,
-                'aporte_necessario': 0,
-                'acoes_por_ativo': {},
-                'valores_finais': {},
-                'percentuais_atuais': {},
-                'percentuais_finais': {},
-                'total_vendas': 0,
-                'total_aportes_internos': 0
-            }
-    
-    # 1. Calcular patrimônio alvo mínimo
-    patrimonio_alvo = _calcular_patrimonio_alvo_minimo(ativos_atuais, percentuais_alvo, ativos_fixos)
-    
-    # 2. Calcular valores alvo para cada ativo
-    valores_alvo = {}
-    for ativo, perc_alvo in percentuais_alvo.items():
-        if ativo in ativos_fixos:
-            valores_alvo[ativo] = ativos_atuais[ativo]  # Manter fixo
-        else:
-            valores_alvo[ativo] = (perc_alvo / 100) * patrimonio_alvo
-    
-    # 3. Calcular ações necessárias
-    acoes_por_ativo = {}
-    total_aportes_internos = 0
-    total_vendas = 0
-    
-    for ativo, valor_atual in ativos_atuais.items():
-        valor_alvo = valores_alvo[ativo]
-        
-        if ativo in ativos_fixos:
-            acoes_por_ativo[ativo] = 0  # Manter fixo
-        elif valor_alvo > valor_atual:
-            # Precisa de aporte
-            aporte_necessario = valor_alvo - valor_atual
-            acoes_por_ativo[ativo] = aporte_necessario
-            total_aportes_internos += aporte_necessario
-        elif valor_alvo < valor_atual:
-            # Pode ser vendido
-            venda_possivel = valor_atual - valor_alvo
-            acoes_por_ativo[ativo] = -venda_possivel
-            total_vendas += venda_possivel
-        else:
-            acoes_por_ativo[ativo] = 0  # Já no alvo
-    
-    # 4. Verificar viabilidade
-    aporte_necessario = total_aportes_internos - total_vendas
-    
-    if valor_aporte_disponivel != POSITIVE_INFINITY and aporte_necessario > valor_aporte_disponivel:
-        return {
-            'viavel': False,
-            'motivo_inviabilidade': f"Aporte necessário (R$ {aporte_necessario:,.2f}) excede disponível (R$ {valor_aporte_disponivel:,.2f})",
-            'patrimonio_atual': patrimonio_atual,
-            'patrimonio_alvo': patrimonio_alvo,
-            'aporte_necessario': aporte_necessario,
-            'acoes_por_ativo': acoes_por_ativo,
-            'valores_finais': valores_alvo,
-            'percentuais_atuais': calcular_percentuais_atuais(ativos_atuais),
-            'percentuais_finais': {ativo: (valor / patrimonio_alvo) * 100 for ativo, valor in valores_alvo.items()},
-            'total_vendas': total_vendas,
-            'total_aportes_internos': total_aportes_internos
-        }
-    
-    # 5. Calcular percentuais atuais e finais
-    percentuais_atuais = calcular_percentuais_atuais(ativos_atuais)
-    percentuais_finais = {}
-    for ativo, valor_final in valores_alvo.items():
-        percentuais_finais[ativo] = (valor_final / patrimonio_alvo) * 100
-    
-    return {
-        'viavel': True,
-        'motivo_inviabilidade': None,
-        'patrimonio_atual': patrimonio_atual,
-        'patrimonio_alvo': patrimonio_alvo,
-        'aporte_necessario': max(0, aporte_necessario),  # Não pode ser negativo
-        'acoes_por_ativo': acoes_por_ativo,
-        'valores_finais': valores_alvo,
-        'percentuais_atuais': percentuais_atuais,
-        'percentuais_finais': percentuais_finais,
-        'total_vendas': total_vendas,
-        'total_aportes_internos': total_aportes_internos
-    }
+    # Ativos divergentes: o cálculo sem cache levanta o mesmo ValueError de validar_entradas
+    if ativos_atuais.keys() != percentuais_alvo.keys():
+        return calcular_rebalanceamento_otimizado(ativos_atuais, percentuais_alvo, valor_aporte_disponivel,
+                                                  ativos_fixos, verbose=False)
+    
+    # ativos_atuais entra na chave como está: sua ordem define a ordem dos resultados.
+    # Os alvos seguem essa mesma ordem, sem precisar ordenar (nem comparar) as chaves.
+    resultado = _rebalanceamento_silencioso_memorizado(
+        tuple(ativos_atuais.items()),
+        tuple((ativo, percentuais_alvo[ativo]) for ativo in ativos_atuais),
+        valor_aporte_disponivel,
+        tuple(ativos_fixos or ())
+    )
+    # Cópias dos dicionários para que o objeto memorizado nunca seja alterado pelo chamador
+    return replace(
+        resultado,
+        acoes_por_ativo=dict(resultado.acoes_por_ativo),
+        valores_finais=dict(resultado.valores_finais),
+        percentuais_atuais=dict(resultado.percentuais_atuais),
+        percentuais_finais=dict(resultado.percentuais_finais)
+    )
+
+
+@lru_cache(maxsize=512)
+def _rebalanceamento_silencioso_memorizado(ativos_itens, percentuais_itens, valor_aporte_disponivel, fixos_itens):
+    """
+    Adaptador memorizado: recebe as entradas como tuplas (hasheáveis).
+    """
+    return calcular_rebalanceamento_otimizado(dict(ativos_itens), dict(percentuais_itens),
+                                              valor_aporte_disponivel, list(fixos_itens) or None,
+                                              verbose=False)
 
 
 if __name__ == "__main__":
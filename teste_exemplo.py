@@ -3,7 +3,9 @@
 Teste do exemplo específico mencionado pelo usuário
 """
 
-from script import calcular_rebalanceamento_otimizado_silencioso
+import sys
+
+from script import calcular_percentuais_atuais, calcular_rebalanceamento_otimizado_silencioso
 
 def testar_exemplo_usuario():
     """
@@ -30,10 +32,11 @@ def testar_exemplo_usuario():
     patrimonio_atual = sum(ativos_atuais.values())
     print(f"Patrimônio atual: R$ {patrimonio_atual:,.2f}")
     
-    for ativo, valor in ativos_atuais.items():
-        perc_atual = (valor / patrimonio_atual) * 100
-        perc_alvo = percentuais_alvo[ativo]
-        print(f"  {ativo}: R$ {valor:,.2f} ({perc_atual:.1f}% atual → {perc_alvo:.1f}% alvo)")
+    # Percentuais atuais de uma vez, com a mesma função usada pelo cálculo
+    percentuais_atuais = calcular_percentuais_atuais(ativos_atuais, patrimonio_atual)
+    linhas = [f"  {ativo}: R$ {valor:,.2f} ({perc_atual:.1f}% atual → {percentuais_alvo[ativo]:.1f}% alvo)"
+              for (ativo, valor), perc_atual in zip(ativos_atuais.items(), percentuais_atuais.values())]
+    sys.stdout.write("\n".join(linhas) + "\n")
     
     print("\nRESULTADO ESPERADO:")
     print("  Patrimônio alvo: ~R$ 102,04")
@@ -45,33 +48,37 @@ def testar_exemplo_usuario():
     resultado = calcular_rebalanceamento_otimizado_silencioso(ativos_atuais, percentuais_alvo)
     
     print("\nRESULTADO OBTIDO:")
-    if resultado['viavel']:
-        print(f"  Patrimônio alvo: R$ {resultado['patrimonio_alvo']:,.2f}")
-        print(f"  Aporte externo necessário: R$ {resultado['aporte_necessario']:,.2f}")
+    if resultado.viavel:
+        print(f"  Patrimônio alvo: R$ {resultado.patrimonio_alvo:,.2f}")
+        print(f"  Aporte externo necessário: R$ {resultado.aporte_necessario:,.2f}")
         print()
         
-        for ativo, acao in resultado['acoes_por_ativo'].items():
+        # Template resolvido uma vez; cada linha de compra/venda formata três valores
+        formatar_acao = "  {}: {} R$ {:,.2f} (de R$ {:,.2f} para R$ {:,.2f})".format
+        valores_finais = resultado.valores_finais
+        linhas = []
+        for ativo, acao in resultado.acoes_por_ativo.items():
             valor_atual = ativos_atuais[ativo]
-            valor_final = resultado['valores_finais'][ativo]
             
             if acao > 0:
-                print(f"  {ativo}: Comprar R$ {acao:,.2f} (de R$ {valor_atual:,.2f} para R$ {valor_final:,.2f})")
+                linhas.append(formatar_acao(ativo, "Comprar", acao, valor_atual, valores_finais[ativo]))
             elif acao < 0:
-                print(f"  {ativo}: Vender R$ {abs(acao):,.2f} (de R$ {valor_atual:,.2f} para R$ {valor_final:,.2f})")
+                linhas.append(formatar_acao(ativo, "Vender", -acao, valor_atual, valores_finais[ativo]))
             else:
-                print(f"  {ativo}: Manter R$ {valor_atual:,.2f}")
+                linhas.append(f"  {ativo}: Manter R$ {valor_atual:,.2f}")
+        sys.stdout.write("\n".join(linhas) + "\n")
         
-        print(f"\n  Total vendas internas: R$ {resultado['total_vendas']:,.2f}")
-        print(f"  Total compras internas: R$ {resultado['total_aportes_internos']:,.2f}")
+        print(f"\n  Total vendas internas: R$ {resultado.total_vendas:,.2f}")
+        print(f"  Total compras internas: R$ {resultado.total_aportes_internos:,.2f}")
         
         # Verificar percentuais finais
         print("\n  PERCENTUAIS FINAIS:")
-        for ativo, perc_final in resultado['percentuais_finais'].items():
-            perc_alvo = percentuais_alvo[ativo]
-            print(f"    {ativo}: {perc_final:.2f}% (alvo: {perc_alvo:.1f}%)")
+        linhas = [f"    {ativo}: {perc_final:.2f}% (alvo: {percentuais_alvo[ativo]:.1f}%)"
+                  for ativo, perc_final in resultado.percentuais_finais.items()]
+        sys.stdout.write("\n".join(linhas) + "\n")
             
     else:
-        print(f"  INVIÁVEL: {resultado['motivo_inviabilidade']}")
+        print(f"  INVIÁVEL: {resultado.motivo_inviabilidade}")
 
 
 def testar_casos_adicionais():
@@ -85,16 +92,25 @@ def testar_casos_adicionais():
     ativos1 = {'A': 30, 'B': 70}
     alvos1 = {'A': 30, 'B': 70}
     resultado1 = calcular_rebalanceamento_otimizado_silencioso(ativos1, alvos1)
-    print(f"Patrimônio alvo: R$ {resultado1['patrimonio_alvo']:,.2f} (atual: R$ 100)")
+    print(f"Patrimônio alvo: R$ {resultado1.patrimonio_alvo:,.2f} (atual: R$ 100)")
     
     # Caso 2: Um ativo muito sobrevalorizado
     print("\nCASO 2: Ativo muito sobrevalorizado")
     ativos2 = {'A': 90, 'B': 10}
     alvos2 = {'A': 20, 'B': 80}
     resultado2 = calcular_rebalanceamento_otimizado_silencioso(ativos2, alvos2)
-    print(f"Patrimônio alvo: R$ {resultado2['patrimonio_alvo']:,.2f} (atual: R$ 100)")
-    if resultado2['viavel']:
-        print(f"A: {resultado2['acoes_por_ativo']['A']:+.2f}, B: {resultado2['acoes_por_ativo']['B']:+.2f}")
+    print(f"Patrimônio alvo: R$ {resultado2.patrimonio_alvo:,.2f} (atual: R$ 100)")
+    if resultado2.viavel:
+        print(f"A: {resultado2.acoes_por_ativo['A']:+.2f}, B: {resultado2.acoes_por_ativo['B']:+.2f}")
+    
+    # Caso 3: Sem aporte disponível, o rebalanceamento só com vendas internas continua viável
+    print("\nCASO 3: Sem aporte disponível")
+    ativos3 = {'A': 317.80, 'B': 434.15}
+    alvos3 = {'A': 80, 'B': 20}
+    resultado3 = calcular_rebalanceamento_otimizado_silencioso(ativos3, alvos3, valor_aporte_disponivel=0)
+    print(f"Viável: {resultado3.viavel}, aporte necessário: R$ {resultado3.aporte_necessario:,.2f}")
+    # Arredondamento entre compras e vendas não pode virar aporte positivo
+    assert resultado3.viavel and resultado3.aporte_necessario == 0, resultado3.motivo_inviabilidade
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Confere o rebalanceamento em lote (lote.py) contra o cálculo unitário (script.py)
+"""
+
+import math
+
+import numpy as np
+
+from lote import calcular_rebalanceamento_lote
+from script import calcular_rebalanceamento_otimizado
+
+
+def _conferir_cenarios(valores, percentuais_alvo, valor_aporte_disponivel=None, mascara_fixos=None):
+    """
+    Resolve os cenários em lote e um a um, e verifica que os resultados coincidem.
+    """
+    nomes = [f"A{i}" for i in range(len(percentuais_alvo))]
+    fixos = None if mascara_fixos is None else [nome for nome, fixo in zip(nomes, mascara_fixos) if fixo]
+    lote = calcular_rebalanceamento_lote(valores, percentuais_alvo, valor_aporte_disponivel, mascara_fixos)
+
+    for i, linha in enumerate(valores):
+        unitario = calcular_rebalanceamento_otimizado(
+            dict(zip(nomes, linha)), dict(zip(nomes, percentuais_alvo)),
+            valor_aporte_disponivel, fixos, verbose=False
+        )
+        print(f"  Cenário {i}: viável={unitario.viavel}, patrimônio alvo R$ {unitario.patrimonio_alvo:,.2f}, "
+              f"aporte R$ {unitario.aporte_necessario:,.2f}")
+
+        assert unitario.viavel == lote.viavel[i], (i, unitario.motivo_inviabilidade)
+        assert math.isclose(unitario.patrimonio_alvo, lote.patrimonio_alvo[i], rel_tol=1e-9, abs_tol=1e-6)
+        assert math.isclose(unitario.aporte_necessario, lote.aporte_necessario[i], rel_tol=1e-9, abs_tol=1e-6)
+        # Fixos incompatíveis: o cálculo unitário devolve dicionários vazios
+        for j, nome in enumerate(unitario.acoes_por_ativo):
+            assert math.isclose(unitario.acoes_por_ativo[nome], lote.acoes[i, j], rel_tol=1e-9, abs_tol=1e-6)
+            assert math.isclose(unitario.valores_finais[nome], lote.valores_finais[i, j], rel_tol=1e-9, abs_tol=1e-6)
+            assert math.isclose(unitario.percentuais_finais[nome], lote.percentuais_finais[i, j],
+                                rel_tol=1e-9, abs_tol=1e-6)
+
+
+def testar_lote_contra_unitario():
+    """
+    Cenários sem fixos, com fixos (compatíveis ou não) e com limite de aporte
+    """
+    print("=== LOTE x UNITÁRIO ===")
+
+    valores = np.array([
+        [10.0, 10.0, 50.0],
+        [90.0, 10.0, 40.0],
+        [30.0, 30.0, 40.0],
+    ])
+    percentuais_alvo = [1.0, 50.0, 49.0]
+
+    print("\nSem ativos fixos, sem limite de aporte:")
+    _conferir_cenarios(valores, percentuais_alvo)
+
+    print("\nSem ativos fixos, limite de aporte de R$ 20,00:")
+    _conferir_cenarios(valores, percentuais_alvo, valor_aporte_disponivel=20.0)
+
+    print("\nAtivo A2 fixo (só o último cenário é compatível):")
+    _conferir_cenarios(np.array([[10.0, 10.0, 50.0], [25.5, 25.5, 49.0]]), percentuais_alvo,
+                       mascara_fixos=[False, False, True])
+
+    # Fixo dentro da tolerância, mas acima do alvo: exige aporte, que excede o limite no 1º cenário
+    print("\nAtivo A2 fixo, limite de aporte de R$ 20,00:")
+    _conferir_cenarios(np.array([[255000.0, 254950.0, 490050.0], [25.5, 25.5, 49.0]]), percentuais_alvo,
+                       valor_aporte_disponivel=20.0, mascara_fixos=[False, False, True])
+
+    # Compras e vendas que só diferem por arredondamento não podem exigir aporte
+    print("\nSem aporte disponível (só vendas internas):")
+    _conferir_cenarios(np.array([[0.0, 312.13, 205.47, 177.71, 427.83], [317.80, 434.15, 0.0, 0.0, 0.0]]),
+                       [40.0, 20.0, 10.0, 20.0, 10.0], valor_aporte_disponivel=0.0)
+
+    # Fixo com alvo de 0% não define patrimônio alvo: o lote recusa a entrada
+    print("\nAtivo fixo com percentual alvo zero:")
+    for valores_fixo_zero in ([[100.0, 50.0, 0.0]], [[100.0, 50.0, 0.001]]):
+        try:
+            calcular_rebalanceamento_lote(valores_fixo_zero, [66.67, 33.33, 0.0], mascara_fixos=[False, False, True])
+        except ValueError as erro:
+            print(f"  Recusado: {erro}")
+        else:
+            raise AssertionError("ativo fixo com alvo zero deveria ser recusado")
+
+
+if __name__ == "__main__":
+    testar_lote_contra_unitario()